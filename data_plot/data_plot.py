@@ -1,16 +1,27 @@
 #!/usr/bin/env python3
-import argparse, csv, os
+import argparse, os
 import pandas as pd
 import matplotlib.pyplot as plt
-from threading import thre
 
 def sniff_sep(path):
+    # the separator is the candidate found the same number of times in the first two lines
     with open(path, "r", newline="") as f:
-        sample = f.read(4096)
-    try:
-        return csv.Sniffer().sniff(sample).delimiter
-    except Exception:
-        return ","  # default
+        h1 = f.readline()
+        h2 = f.readline()
+    candidates = [(h1.count(sep), sep) for sep in ",;\t|" if h1.count(sep) and h1.count(sep) == h2.count(sep)]
+    return max(candidates)[1] if candidates else ","  # default
+
+def read_csv(path, sep, decimal, usecols=None, parse_dates=None):
+    # pyarrow parses multithreaded but only takes single char separators,
+    # the default engine is the fallback for regex separators or when it is not installed
+    if sep and len(sep) == 1:
+        try:
+            return pd.read_csv(path, sep=sep, decimal=decimal, usecols=usecols,
+                               parse_dates=parse_dates, engine="pyarrow")
+        except ImportError:
+            pass
+    return pd.read_csv(path, sep=sep, decimal=decimal, usecols=usecols,
+                       parse_dates=parse_dates)
 
 def main():
     p = argparse.ArgumentParser(description="Plot columns from a CSV.")
@@ -25,14 +36,17 @@ def main():
     args = p.parse_args()
 
     sep = args.sep or sniff_sep(args.csv)
-    df = pd.read_csv(args.csv, sep=sep, decimal=args.decimal)
 
     # Choose X column
-    xcol = args.x or df.columns[0]
+    xcol = args.x or pd.read_csv(args.csv, sep=sep, nrows=0).columns[0]
 
     # Parse dates if the X looks like time
     parse_as_date = any(k in xcol.lower() for k in ("time", "date", "timestamp"))
-    if parse_as_date:
+
+    df = read_csv(args.csv, sep, args.decimal,
+                  usecols=[xcol, *args.y] if args.y else None,
+                  parse_dates=[xcol] if parse_as_date else None)
+    if parse_as_date and not pd.api.types.is_datetime64_any_dtype(df[xcol]):
         df[xcol] = pd.to_datetime(df[xcol], errors="coerce")
 
     # Choose Y columns
@@ -0,0 +1,70 @@
+import numpy as np
+
+class RingBuffer:
+    """
+    Fixed size float64 ring buffer for x and all y values (one row each).
+    Row 0 is x, rows 1.. are the keys in order, all rows share one head so
+    x and y always have the same length.
+    Every sample is written twice (at i and i + n) so the last n samples are
+    always one contiguous block and view() never copies.
+    One writer thread and one reader thread. Seqlock style, the writer sets
+    writing to the count it is about to reach before it touches the data and
+    publishes the samples by setting count to it afterwards.
+    """
+    def __init__(self, keys, n:int):
+        self.keys = tuple(keys)
+        self.n = n
+        self.a = np.empty((1 + len(self.keys), 2 * n), dtype=np.float64)
+        # number of samples stored so far, never wraps
+        self.count = 0
+        # count once the write in progress is done, equal to count between writes
+        self.writing = 0
+
+    def push(self, t, vals):
+        i = self.count % self.n
+        self.writing = self.count + 1
+        col = self.a[:, i]
+        col[0] = t
+        col[1:] = vals
+        self.a[:, i + self.n] = col
+        self.count = self.writing
+
+    def extend(self, t, vals):
+        """Appends t (samples,) and vals (keys, samples) at once."""
+        block = np.vstack((t, vals))[:, -self.n:]
+        k = block.shape[1]
+        n = self.n
+        i = self.count % n
+        first = min(k, n - i)
+        self.writing = self.count + k
+        for off in (0, n):
+            self.a[:, off + i:off + i + first] = block[:, :first]
+            self.a[:, off:off + k - first] = block[:, first:]
+        self.count = self.writing
+
+    def _view(self, count):
+        if count >= self.n:
+            i = count % self.n
+            return self.a[:, i:i + self.n]
+        return self.a[:, :count]
+
+    def view(self):
+        """(1 + keys, samples) view of the buffered data, oldest sample first."""
+        return self._view(self.count)
+
+    def snapshot(self):
+        """
+        Copy of view() which is safe to take while the writer thread pushes.
+        The writer overwrites the oldest samples of the window first, so
+        every sample of a write that was in progress or started during the
+        copy is dropped from its front.
+        """
+        count = self.count
+        v = self._view(count).copy()
+        torn = self.writing - count
+        if torn:
+            return v[:, min(torn, v.shape[1]):]
+        return v
+
+    def __len__(self):
+        return min(self.count, self.n)
@@ -3,38 +3,170 @@
 todo: add routing keyboard input to serial
 """
 
-from datetime import datetime
 import argparse
+import os
 import sys
+import time
 import threading
-import queue
 from collections import deque
 import logging
+import logging.handlers
+import queue
+import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
 from pathlib import Path
+from ring_buffer import RingBuffer
+
+if "MPLBACKEND" not in os.environ:
+    try:
+        # QtAgg handles the animation timer and blit faster than the Tk default
+        plt.switch_backend("QtAgg")
+    except ImportError:
+        pass
+
+# plot refresh rate cap, the animation timer fires every 1000 / MAX_FPS ms
+MAX_FPS = 40
+# frames between axis limit checks
+RESCALE_FRAMES = 20
+# part of the data span added around the data when axis limits have to move
+LIM_MARGIN = 0.05
+# ms between checks whether the worker stopped and the window has to close
+STOP_POLL_MS = 200
+
+def _ts():
+    return time.strftime('%Y-%m-%d_%H_%M_%S')
 
-def keyboard_input(in_q: queue.Queue):
+def keyboard_input(in_q: deque):
     """Reads user input and pushes it to the queue."""
     while True:
         line = sys.stdin.readline()
-        in_q.put(line)
+        if not line:
+            # stdin closed, readline() would return '' in a busy loop
+            break
+        in_q.append(line)
+
+class CachedTimeFormatter(logging.Formatter):
+    """Formatter which runs strftime for asctime once per second instead of once per record."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sec_cache = (None, "")
+
+    def formatTime(self, record, datefmt=None):
+        if datefmt:
+            return super().formatTime(record, datefmt)
+        sec, sec_str = self.sec_cache
+        if sec != int(record.created):
+            sec = int(record.created)
+            sec_str = time.strftime(self.default_time_format, self.converter(record.created))
+            # one tuple store, the stream and file handlers share this formatter
+            self.sec_cache = (sec, sec_str)
+        return self.default_msec_format % (sec_str, record.msecs)
+
+class BatchFileHandler(logging.FileHandler):
+    """
+    FileHandler which flushes every flush_n records or flush_s seconds
+    instead of after every record. Pending records are written on close().
+    """
+    def __init__(self, filename, flush_n=256, flush_s=1.0, mode='a', encoding=None):
+        super().__init__(filename, mode, encoding)
+        self.flush_n = flush_n
+        self.flush_s = flush_s
+        self.pending = 0
+        self.last_flush = time.monotonic()
+
+    def _open(self):
+        # large buffer, the OS only sees a write when it fills or on flush
+        return open(self.baseFilename, self.mode, buffering=1 << 20,
+                    encoding=self.encoding, errors=self.errors)
+
+    def emit(self, record):
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(self.format(record) + self.terminator)
+            self.pending += 1
+            now = time.monotonic()
+            if self.pending >= self.flush_n or now - self.last_flush >= self.flush_s:
+                self.flush()
+                self.pending = 0
+                self.last_flush = now
+        except Exception:
+            self.handleError(record)
 
-def plot_update(frame, ax, lines, ready_event:threading.Event, x_buf:deque, y_bufs:deque):
+def update_lim(lim, lo, hi, margin=LIM_MARGIN):
+    """
+    Returns new axis limits for data in [lo, hi] or None if lim can stay.
+    Limits grow with a margin once data leaves them and shrink only when the
+    padded data covers less than half of them, so most frames keep the blit background.
+    """
+    if not (np.isfinite(lo) and np.isfinite(hi)):
+        return None
+    span = hi - lo
+    pad = span * margin if span > 0 else 0.5
+    # padded span, constant data then still fits the limits set for it
+    if lo >= lim[0] and hi <= lim[1] and span + 2 * pad >= (lim[1] - lim[0]) / 2:
+        return None
+    return lo - pad, hi + pad
+
+def minmax_decimate(x, y, n_buckets):
+    """
+    Reduces x, y to the min and max sample of each of at most n_buckets
+    buckets, which keeps the envelope of the line. Data with fewer than
+    three samples per bucket is returned as is.
+    """
+    n = len(x)
+    if n < 3 * n_buckets:
+        return x, y
+    # ceil sized buckets so every sample lands in one, the last is padded with the last sample
+    b = -(-n // n_buckets)
+    nb = -(-n // b)
+    yb = np.concatenate((y, np.full(nb * b - n, y[-1]))).reshape(nb, b)
+    pair = np.sort(np.stack((yb.argmin(axis=1), yb.argmax(axis=1)), axis=1), axis=1)
+    idx = np.minimum((pair + np.arange(0, nb * b, b)[:, None]).ravel(), n - 1)
+    return x[idx], y[idx]
+
+def rescale(ax, buf:RingBuffer):
+    """Moves the axis limits when the buffered data left them, returns True if they changed."""
+    # a view() could hold new samples in its oldest columns while the reader thread writes
+    v = buf.snapshot()
+    if not v.shape[1]:
+        return False
+    # no relim(), limits only move when the data leaves them
+    xlim = update_lim(ax.get_xlim(), v[0, 0], v[0, -1])
+    ylim = update_lim(ax.get_ylim(), np.nanmin(v[1:]), np.nanmax(v[1:]))
+    if xlim:
+        ax.set_xlim(xlim)
+    if ylim:
+        ax.set_ylim(ylim)
+    return bool(xlim or ylim)
+
+def plot_update(frame, ax, lines, ready_event:threading.Event, buf:RingBuffer):
     # Update data each frame
     if ready_event.is_set():
         ready_event.clear()
-        for line_i in lines:
-            lines[line_i].set_data(x_buf, y_bufs[line_i])
+        # copy, the reader thread keeps writing into the buffer while the lines are set
+        v = buf.snapshot()
+        # about two points per pixel column, more only adds overdraw
+        n_px = max(int(ax.bbox.width), 1)
+        # one x row shared by all lines, lines are in buf.keys order
+        for i, line in enumerate(lines, 1):
+            line.set_data(*minmax_decimate(v[0], v[i], n_px))
 
-        ax.relim()
-        ax.autoscale_view(scaley=True)
+    # limits are checked every RESCALE_FRAMES frames, all other frames only blit the lines
+    if frame % RESCALE_FRAMES == 0 and rescale(ax, buf):
+        # ticks changed, full redraw so blit caches the new background
+        ax.figure.canvas.draw()
 
-    return lines,
+    return lines
 
 def on_close(event, stop_event):
         stop_event.set()
 
+def check_stop(fig, stop_event):
+    if stop_event.is_set():
+        plt.close(fig)
+
 def main():
     p = argparse.ArgumentParser(description="Data plotter")
     p.add_argument("-w",  dest="worker",   required=True,  help="worker script for gathering data, e.g: 'worker_serial_str'")
@@ -47,29 +179,39 @@ def main():
     p.add_argument("-s",  dest="start_time", default=0,    type=int, help="time between samples in ms")
     p.add_argument("-f",  dest="file",  help="if set data will be saved to this file in case of worker_csv csv file to open and plot")
     p.add_argument("-n",  dest="name",  default=None, help="plot name")
+    p.add_argument("-rt", "--realtime", dest="realtime", action="store_true", help="replay worker_csv files at the speed of their timestamps (first column, in s)")
+    p.add_argument("-fp", dest="fast_parse", action="store_true", help="parse serial lines in batches, needs the keys in -k order in every line and -st")
     args = p.parse_args()
 
-    log_file_name = f"{args.file}_{datetime.now().strftime('%Y-%m-%d_%H_%M_%S')}.log" if args.file else "data plotter"
+    log_file_name = f"{args.file}_{_ts()}.log" if args.file else "data plotter"
     logger = logging.getLogger(log_file_name)
     logger.setLevel(logging.INFO)
     handler = logging.StreamHandler()
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    # received lines are logged at DEBUG, they only go to the log file
+    handler.setLevel(logging.INFO)
+    formatter = CachedTimeFormatter('%(asctime)s - %(levelname)s - %(message)s')
     handler.setFormatter(formatter)
     logger.addHandler(handler)
 
+    file_handler = None
+    file_listener = None
     if (args.file and
             args.worker != "worker_csv" and
             args.worker != "worker_log" and
             args.worker != "worker_log_cut"):
-        file_handler = logging.FileHandler(log_file_name)
+        logger.setLevel(logging.DEBUG)
+        file_handler = BatchFileHandler(log_file_name)
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+        # the reader thread only enqueues, the file is written by the listener thread
+        log_q = queue.SimpleQueue()
+        logger.addHandler(logging.handlers.QueueHandler(log_q))
+        file_listener = logging.handlers.QueueListener(log_q, file_handler)
+        file_listener.start()
 
     stop_event = threading.Event()
     ready_event = threading.Event()
 
-    x_buf  = deque(maxlen=args.wp)
-    y_bufs = {k: deque(maxlen=args.wp) for k in args.keys}
+    buf = RingBuffer(args.keys, args.wp)
 
     if args.worker == "worker_serial_str":
         from worker_serial_str import WorkerSerialStr
@@ -78,8 +220,9 @@ def main():
                 log_file_name,
                 args.port, int(args.baudrate), float(args.timeout),
                 stop_event, ready_event,
+                buf,
                 args.st,
-                x_src = x_buf, y_src = y_bufs
+                fast_parse = args.fast_parse
             )
         except Exception as e:
             logger.error(f"An unexpected error occurred: {e}")
@@ -91,7 +234,8 @@ def main():
                 log_file_name,
                 args.file,
                 stop_event, ready_event,
-                x_src = x_buf, y_src = y_bufs
+                buf,
+                realtime = args.realtime
             )
         except Exception as e:
             logger.error(f"An unexpected error occurred: {e}")
@@ -103,7 +247,7 @@ def main():
                 log_file_name,
                 args.file,
                 stop_event, ready_event,
-                x_src = x_buf, y_src = y_bufs,
+                buf,
                 ts_inc_us = args.st * 1000
             )
         except Exception as e:
@@ -116,7 +260,7 @@ def main():
                 log_file_name,
                 args.file,
                 stop_event, ready_event,
-                x_src = x_buf, y_src = y_bufs,
+                buf,
                 ts_inc_us = args.st * 1000,
                 start_time_s = args.start_time,
                 sample_duration_ms = args.wp
@@ -131,7 +275,7 @@ def main():
                 log_file_name,
                 args.name,
                 stop_event, ready_event,
-                x_src = x_buf, y_src = y_bufs
+                buf
             )
         except Exception as e:
             logger.error(f"An unexpected error occurred: {e}")
@@ -140,13 +284,10 @@ def main():
 
     worker.start()
 
-    in_q = queue.Queue()
+    in_q = deque(maxlen=10000)
     keyboard_thread = threading.Thread(target=keyboard_input, args=(in_q,), daemon=True)
     keyboard_thread.start()
 
-    if args.worker != "worker_log":
-        plt.ion()
-
     fig, ax = plt.subplots(figsize=(12, 6))
     fig.canvas.mpl_connect('close_event', lambda event: on_close(event, stop_event))
 
@@ -157,13 +298,15 @@ def main():
 
     fig.canvas.manager.set_window_title(args.name)
 
-    lines = {}
-    for k in args.keys:
+    # line artists in buf.keys order, the same tuple is returned to blit every frame
+    lines = []
+    for i, k in enumerate(buf.keys, 1):
         if args.worker == "worker_log":
-            line, = ax.plot(x_buf, y_bufs[k], label=k)
+            line, = ax.plot(buf.view()[0], buf.view()[i], label=k)
         else:
-            line, = ax.plot([], [], label=k)  # no explicit colors
-            lines[k] = line
+            line, = ax.plot([], [], label=k, animated=True)  # no explicit colors
+            lines.append(line)
+    lines = tuple(lines)
 
     ax.set_xlabel("Time [s]")
     ax.set_ylabel("Value")
@@ -174,16 +317,19 @@ def main():
     if args.worker != "worker_log":
         anim = animation.FuncAnimation(fig,
                                        plot_update,
-                                       fargs=(ax, lines, ready_event, x_buf, y_bufs),
-                                       interval=1,
-                                       blit=False,
+                                       fargs=(ax, lines, ready_event, buf),
+                                       interval=int(1000 / MAX_FPS),
+                                       blit=True,
                                        cache_frame_data=False)
-    else:
-        plt.show()
+
+    # the GUI main loop blocks in plt.show(), this timer ends it once the worker stopped
+    stop_timer = fig.canvas.new_timer(interval=STOP_POLL_MS)
+    stop_timer.add_callback(check_stop, fig, stop_event)
+    stop_timer.start()
 
     try:
-        while not stop_event.is_set():
-            plt.pause(0.01)
+        # no plt.ion() or plt.pause(), both redraw the whole (always stale) figure
+        plt.show()
     except KeyboardInterrupt:
         raise
     except Exception as e:
@@ -193,6 +339,10 @@ def main():
         stop_event.set()
         worker.join(timeout=0.1)
         keyboard_thread.join(timeout=0.1)
+        if file_listener:
+            # writes the queued records before the file is closed
+            file_listener.stop()
+            file_handler.close()
         sys.exit(0)
 
 if __name__ == "__main__":
@@ -1,11 +1,17 @@
 import logging
-from collections import deque
-from time import sleep
+from time import monotonic
 
+import numpy as np
 import pandas as pd
 from threading import Event
 from threading import Thread
 import os
+from ring_buffer import RingBuffer
+
+# rows pushed to the plot buffer at once in realtime replay
+CSV_CHUNK_ROWS = 256
+# rows parsed from the file at once
+CSV_READ_ROWS = 100_000
 
 class WorkerCsv:
     def __init__(
@@ -13,7 +19,8 @@ class WorkerCsv:
             file_csv,
             stop_event:Event,
             ready_event:Event,
-            x_src:deque=[], y_src:deque=[],
+            src:RingBuffer,
+            realtime:bool=False
     ):
         if logger_name:
             self.logger = logging.getLogger(logger_name)
@@ -25,16 +32,16 @@ class WorkerCsv:
         self.file_csv = file_csv
         self.stop_event = stop_event
         self.ready_event = ready_event
-        self.x_src = x_src
-        self.y_src = y_src
-        self.keys = list(y_src.keys())
+        self.src = src
+        self.realtime = realtime
+        self.keys = list(src.keys)
         self.logger.info(f"Keys={self.keys}")
 
         self.logger.info("Reading... Close the plot window or Ctrl+C to stop.")
 
         self.reader = Thread(
             target=csv_reader,
-            args=(self.logger, self.file_csv, self.keys, self.x_src, self.y_src, ready_event, stop_event),
+            args=(self.logger, self.file_csv, self.keys, self.src, ready_event, stop_event, self.realtime),
             daemon=True
         )
 
@@ -45,17 +52,34 @@ class WorkerCsv:
         self.reader.join(timeout)
 
 
-def csv_reader(logger, file_csv, keys, x_src, y_src, ready_event, stop_event):
-    with open(file_csv, mode='r', newline='') as file:
-        df = pd.read_csv(file_csv)
-        header = df.columns.tolist()
-        logger.info(f"headers: {header}")
-        for index, row in df.iterrows():
-            # considering that first row in csv file is timestamp
-            x_src.append(row[0])
-            for n in keys:
-                y_src[n].append(row[n])
-
-            if not ready_event.is_set():
+def csv_reader(logger, file_csv, keys, src, ready_event, stop_event, realtime=False):
+    header = pd.read_csv(file_csv, nrows=0).columns.tolist()
+    logger.info(f"headers: {header}")
+    # considering that first column in csv file is timestamp
+    usecols = [header[0]] + [k for k in keys if k != header[0]]
+    # only the plotted columns are parsed, straight to float64, a block of rows at a time
+    with pd.read_csv(file_csv, usecols=usecols, dtype=dict.fromkeys(usecols, np.float64),
+                     engine="c", memory_map=True, chunksize=CSV_READ_ROWS) as reader:
+        t0 = None
+        start = monotonic()
+        for df in reader:
+            if stop_event.is_set():
+                return
+            ts = df[header[0]].to_numpy()
+            ys = df[keys].to_numpy().T
+            if not realtime:
+                # as fast as the file parses, the buffer keeps only the last rows of the block
+                src.extend(ts, ys)
                 ready_event.set()
-            sleep(0.001)
+                continue
+            if t0 is None and len(ts):
+                t0 = ts[0]
+            for i in range(0, len(ts), CSV_CHUNK_ROWS):
+                # wait until the wall clock reaches the timestamp (in s) of the last row of the chunk
+                delay = start + ts[min(i + CSV_CHUNK_ROWS, len(ts)) - 1] - t0 - monotonic()
+                # returns early when the plot window is closed
+                if stop_event.wait(max(delay, 0)):
+                    return
+                src.extend(ts[i:i + CSV_CHUNK_ROWS], ys[:, i:i + CSV_CHUNK_ROWS])
+                if not ready_event.is_set():
+                    ready_event.set()
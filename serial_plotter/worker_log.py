@@ -5,17 +5,26 @@ import re
 from threading import Event
 from threading import Thread
 import os
-from worker_serial_str import parse_line
+from worker_serial_str import parse_line, compile_pattern, new_prefilter, sort_prefilter, PREFILTER_SORT_LINES
 from datetime import datetime
+from ring_buffer import RingBuffer
+import numpy as np
 import alive_progress
 
+# serial timestamp at the start of the logged line, older logs hold the b'...' repr of it,
+# the log record time is the fallback
+TS_RE = re.compile(r"- \w+ - (?:b')?\s*(\d+)\s*\[")
+DATE_RE = re.compile(r"\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}\.\d{3})\]")
+# read buffer of the log file
+LOG_READ_BUF = 1 << 20
+
 class WorkerLog:
     def __init__(
             self, logger_name:str,
             file_log,
             stop_event:Event,
             ready_event:Event,
-            x_src:deque=[], y_src:deque=[],
+            src:RingBuffer,
             ts_inc_us = 0
     ):
         if logger_name:
@@ -28,9 +37,8 @@ class WorkerLog:
         self.file_log = file_log
         self.stop_event = stop_event
         self.ready_event = ready_event
-        self.x_src = x_src
-        self.y_src = y_src
-        self.keys = list(y_src.keys())
+        self.src = src
+        self.keys = list(src.keys)
         self.logger.info(f"Keys={self.keys}")
         self.ts_inc_us = ts_inc_us
 
@@ -38,39 +46,48 @@ class WorkerLog:
 
     def start(self):
         self.ready_event.clear()
-        log_reader(self.logger, self.file_log, self.keys, self.x_src, self.y_src, self.ts_inc_us)
+        log_reader(self.logger, self.file_log, self.keys, self.src, self.ts_inc_us)
         self.ready_event.set()
 
     def join(self, timeout=None):
         pass
 
 
-def log_reader(logger, file_log, keys, x_src, y_src, ts_inc_us):
-    regex=r"-?\d+(?:\.\d+)?"
-    with open(file_log, mode='r', newline='', encoding="utf-8") as file:
-        lines = file.readlines()
-        offset = None
+def log_reader(logger, file_log, keys, src, ts_inc_us):
+    pattern = compile_pattern(keys)
+    prefilter = new_prefilter(keys)
+    # samples are collected and written to the buffer once, it keeps only the last src.n anyway
+    tss = deque(maxlen=src.n)
+    rows = deque(maxlen=src.n)
+    offset = None
+    # streamed line by line, the progress bar counts bytes
+    with open(file_log, mode='rb', buffering=LOG_READ_BUF) as file:
         ts = 0
-        with alive_progress.alive_bar(len(lines)) as bar:
-            for line in lines:
-                data = parse_line(line, keys, regex)
+        with alive_progress.alive_bar(os.path.getsize(file_log), scale="SI", unit="B") as bar:
+            for n_lines, raw in enumerate(file, 1):
+                bar(len(raw))
+                line = raw.decode("utf-8", "replace")
+                data = parse_line(line, pattern, keys, prefilter)
+                if n_lines % PREFILTER_SORT_LINES == 0:
+                    sort_prefilter(prefilter)
                 if data:
                     if ts_inc_us == 0:
-                        match = re.search(r"b'([^[]+)\[", line)
+                        match = TS_RE.search(line)
                         if not match:
-                            match = re.search(r"\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}\.\d{3})\]", line)
+                            match = DATE_RE.search(line)
                             if not match:
                                 continue
                             ts = int(datetime.strptime(match.group(1), "%Y-%m-%d %H:%M:%S.%f").timestamp())
                         else:
-                            ts = int(match.group(1).strip())
+                            ts = int(match.group(1))
                     else:
                         ts += ts_inc_us
 
-                    if not offset:
+                    if offset is None:
                         offset = ts
-                    # set time in sec
-                    x_src.append((ts - offset) / 1000000)
-                    for n in keys:
-                        y_src[n].append(data[n])
-                    bar()
+                    tss.append(ts)
+                    rows.append(data)
+    if rows:
+        t = np.array(tss, dtype=np.int64)
+        # set time in sec relative to the first sample
+        src.extend((t - offset) / 1000000, np.array(rows, dtype=np.float64).T)
@@ -1,10 +1,10 @@
 import logging
-from collections import deque
 import paho.mqtt.client as paho
 from paho.mqtt.enums import CallbackAPIVersion
 from threading import Event
 import json
 import time
+from ring_buffer import RingBuffer
 
 t0 = time.time()
 class WorkerMqtt:
@@ -13,10 +13,10 @@ class WorkerMqtt:
             device,
             stop_event:Event,
             ready_event:Event,
+            src:RingBuffer,
             server = "3.69.177.92",
             port = 1883,
             client_id = "test_station",
-            x_src:deque=[], y_src:deque=[],
     ):
         if logger_name:
             self.logger = logging.getLogger(logger_name)
@@ -29,16 +29,15 @@ class WorkerMqtt:
         self.device = device
         self.stop_event = stop_event
         self.ready_event = ready_event
-        self.x_src = x_src
-        self.y_src = y_src
-        self.keys = list(y_src.keys())
+        self.src = src
+        self.keys = src.keys
         self.logger.info(f"Keys={self.keys}")
 
         self.logger.info("Reading... Close the plot window or Ctrl+C to stop.")
 
         self.client = paho.Client(callback_api_version=CallbackAPIVersion.VERSION1,
                              protocol=paho.MQTTv31, client_id=self.client_id,
-                             userdata={"logger":self.logger, "device":self.device, "keys":self.keys, "rdy_evt":self.ready_event, "x":self.x_src, "y": self.y_src})
+                             userdata={"logger":self.logger, "device":self.device, "keys":self.keys, "rdy_evt":self.ready_event, "src":self.src})
 
 
         self.client.on_connect = on_connect
@@ -61,12 +60,13 @@ def on_message(client, userdata, msg):
     data = json.loads(msg_str)
     if "nameDevice" in data and data["nameDevice"] == userdata["device"]:
         global t0
-        userdata["logger"].info(f"Received message on topic '{msg.topic}': {msg_str}")
+        logger = userdata["logger"]
+        # lazy %-formatting, nothing is built unless the log file takes DEBUG records
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Received message on topic '%s': %s", msg.topic, msg_str)
         ts = time.time() - t0
-        userdata["x"].append(ts)
-
-        for key in userdata["keys"]:
-            userdata["y"][key].append(float(data[key]))
+        # float() per key is cheaper than building a NumPy array for a handful of keys
+        userdata["src"].push(ts, [float(data[key]) for key in userdata["keys"]])
 
         if not userdata["rdy_evt"].is_set():
             userdata["rdy_evt"].set()
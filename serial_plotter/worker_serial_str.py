@@ -1,12 +1,20 @@
 import logging
 import re
-from collections import deque
 from threading import Event
 from threading import Thread
 import time
+import numpy as np
 import serial
 import serial.tools.list_ports
 import serial.tools.list_ports as lp
+from ring_buffer import RingBuffer
+
+NUMBER_RE = r"-?\d+(?:\.\d+)?"
+# number of lines between prefilter re-sorts
+PREFILTER_SORT_LINES = 1000
+# consumed bytes are always dropped once the read index passes this,
+# an unread tail without line end longer than this is discarded
+BUF_COMPACT_SIZE = 64 * 1024
 
 class WorkerSerialStr:
     def __init__(
@@ -14,9 +22,10 @@ class WorkerSerialStr:
             port:str, baudrate:int, timeout:int,
             stop_event:Event,
             ready_event:Event,
+            src:RingBuffer,
             delta_time:int=0,
-            x_src:deque=[], y_src:deque=[],
-            regex=r"-?\d+(?:\.\d+)?"
+            regex=NUMBER_RE,
+            fast_parse:bool=False
     ):
         if logger_name:
             self.logger = logging.getLogger(logger_name)
@@ -29,11 +38,17 @@ class WorkerSerialStr:
         self.stop_event = stop_event
         self.ready_event = ready_event
         self.delta_time = delta_time
-        self.x_src = x_src
-        self.y_src = y_src
+        self.src = src
         self.regex = regex
 
-        self.keys = list(y_src.keys())
+        self.keys = list(src.keys)
+        self.pattern = compile_pattern(self.keys, self.regex)
+        self.frame_pattern = None
+        if fast_parse:
+            if delta_time:
+                self.frame_pattern = compile_frame_pattern(self.keys, self.regex)
+            else:
+                self.logger.warning("Fast parse needs a fixed time between samples, using per line parsing")
         self.logger.info(f"Keys={self.keys}")
 
         try:
@@ -52,7 +67,7 @@ class WorkerSerialStr:
 
         self.reader = Thread(
             target=serial_reader,
-            args=(self.logger, self.regex, self.ser, self.keys, self.x_src, self.y_src, ready_event, stop_event, self.delta_time),
+            args=(self.logger, self.pattern, self.ser, self.keys, self.src, ready_event, stop_event, self.delta_time, self.frame_pattern),
             daemon=True
         )
 
@@ -62,39 +77,145 @@ class WorkerSerialStr:
     def join(self, timeout=None):
         self.reader.join(timeout)
 
-def parse_line(line: str, keys, regex):
-    vals = {}
-    for k in keys:
-        m = re.search(rf"\b{re.escape(k)}\s*[:=]\s*({regex})\b", line)
-        if not m:
+def compile_pattern(keys, regex=NUMBER_RE):
+    """One alternation of all keys so parse_line finds every key=value in a single scan."""
+    return re.compile(r"\b(" + "|".join(re.escape(k) for k in keys) + rf")\s*[:=]\s*({regex})\b")
+
+def compile_frame_pattern(keys, regex=NUMBER_RE):
+    """One pattern for a whole frame with the keys in the given order, used by the fast parse mode."""
+    return re.compile(r".*?".join(rf"\b{re.escape(k)}[ \t]*[:=][ \t]*({regex})\b" for k in keys))
+
+def parse_frames(lines, frame_pattern, n_keys):
+    """Parses a batch of lines with one findall, returns a (frames, keys) array, non matching lines are skipped."""
+    rows = frame_pattern.findall("\n".join(lines))
+    return np.array(rows, dtype=np.float64).reshape(-1, n_keys)
+
+def new_prefilter(keys):
+    """[key, misses] entries for parse_line, sort_prefilter() moves the key that rejects most lines first."""
+    return [[k, 0] for k in keys]
+
+def sort_prefilter(prefilter):
+    prefilter.sort(key=lambda e: e[1], reverse=True)
+    # halve the counts so the order follows changes in the stream
+    for e in prefilter:
+        e[1] //= 2
+
+def parse_line(line: str, pattern, keys, prefilter=None):
+    # cheap substring check first, most lines without all keys never reach the regex
+    if prefilter is None:
+        for k in keys:
+            if k not in line:
+                return None
+    else:
+        for e in prefilter:
+            if e[0] not in line:
+                e[1] += 1
+                return None
+    # reversed so the first occurrence of a key wins
+    vals = dict(reversed(pattern.findall(line)))
+    if len(vals) != len(keys):
+        return None
+    # values in keys order
+    return tuple([float(vals[k]) for k in keys])
+
+
+class LineBuffer:
+    """Serial input bytes, lines are handed out by advancing a read index instead of deleting them."""
+    def __init__(self):
+        self.buf = bytearray()
+        self.head = 0
+        # bytes before this hold no line end, find() does not scan them again
+        self.scan = 0
+
+    def feed(self, data):
+        self.buf += data
+
+    def pop_line(self):
+        """Returns the next complete line without line ending, None if there is none yet."""
+        nl = self.buf.find(b"\n", max(self.head, self.scan))
+        if nl < 0:
+            self.scan = len(self.buf)
             return None
-        vals[k] = float(m.group(1))
-    return vals
+        end = nl
+        if end > self.head and self.buf[end - 1] == 0x0D:
+            end -= 1
+        line = bytes(memoryview(self.buf)[self.head:end])
+        self.head = nl + 1
+        return line
+
+    def compact(self):
+        """Drops consumed bytes, returns the number of unread bytes discarded because no line end came."""
+        tail = len(self.buf) - self.head
+        if tail > BUF_COMPACT_SIZE:
+            # e.g. CR only line endings or noise, the buffer would grow forever
+            self.buf.clear()
+            self.head = 0
+            self.scan = 0
+            return tail
+        # the memmove only covers the unread tail
+        if self.head > BUF_COMPACT_SIZE or self.head > len(self.buf) // 2:
+            del self.buf[:self.head]
+            self.scan = max(self.scan - self.head, 0)
+            self.head = 0
+        return 0
 
 
-def serial_reader(logger, regex, ser, keys, x_src, y_src, ready_event, stop_event, x_delta:int=0):
+def serial_reader(logger, pattern, ser, keys, src, ready_event, stop_event, x_delta:int=0, frame_pattern=None):
+    # time of the last sample in ms
     t_rel = 0
-    start = time.monotonic()
+    start = time.monotonic_ns()
+    line_buf = LineBuffer()
+    prefilter = new_prefilter(keys)
+    n_lines = 0
+    # fast parse mode collects the lines of a chunk and parses them together
+    batch = []
     try:
         while not stop_event.is_set():
+            # drain whatever is pending, otherwise block up to the port timeout for one byte
+            n = ser.in_waiting
+            chunk = ser.read(n if n else 1)
+            if not chunk:
+                continue
+            line_buf.feed(chunk)
             while True:
-                line = f"{ser.readline()}"
-                if line is None:
+                raw = line_buf.pop_line()
+                if raw is None:
                     break
-                if line != "b''":
-                    logger.info(line)
-                    vals = parse_line(line, keys, regex)
+                if raw:
+                    line = raw.decode("utf-8", "replace")
+                    # the text itself, not the b'...' repr of the bytes, only for the log file
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug(line)
+                    if frame_pattern:
+                        batch.append(line)
+                        continue
+                    vals = parse_line(line, pattern, keys, prefilter)
+                    n_lines += 1
+                    if n_lines % PREFILTER_SORT_LINES == 0:
+                        sort_prefilter(prefilter)
                     if vals is not None:
                         if not x_delta:
-                            t_rel = (time.monotonic() - start)
+                            # integer ns clock, the difference is exact however long the run is
+                            t_rel = (time.monotonic_ns() - start) / 1_000_000
                         else:
                             t_rel += x_delta
-                        # set time in sec
-                        x_src.append(t_rel / 1000)
-                        for k in keys:
-                            y_src[k].append(vals[k])
+                        # set time in sec, values are in keys order like the buffer rows
+                        src.push(t_rel / 1000, vals)
                         if not ready_event.is_set():
                             ready_event.set()
+            if batch:
+                frames = parse_frames(batch, frame_pattern, len(keys))
+                batch.clear()
+                if len(frames):
+                    t = t_rel + x_delta * np.arange(1, len(frames) + 1)
+                    t_rel = t[-1]
+                    # set time in sec
+                    src.extend(t / 1000, frames.T)
+                    if not ready_event.is_set():
+                        ready_event.set()
+            dropped = line_buf.compact()
+            if dropped:
+                logger.warning(f"No line end in {dropped} bytes, discarded them")
 
     except Exception as e:
         logger.error(f"Reader error: {e}")